@@ -1,7 +1,91 @@
 from abc import ABC, abstractmethod
+import re
 import jinja2
 import pandas as pd
 
+from mlops_tooling.templates.main import get_environment
+
+# Matches a bare variable substitution such as {{ start_date }}
+_PLACEHOLDER_RE = re.compile(r"{{\s*([A-Za-z_]\w*)\s*}}")
+_JINJA_CONSTANTS = {"true", "false", "none", "True", "False", "None"}
+
+_templates = {}
+
+
+class _Blank(dict):
+    """
+    Renders missing variables as empty strings, matching Jinja's default undefined behaviour.
+    """
+
+    def __missing__(self, key):
+        return ""
+
+
+def _is_default_env(env: jinja2.Environment) -> bool:
+    """
+    Returns whether an environment renders plain substitutions the same way str.format_map does.
+    """
+    return (
+        env.undefined is jinja2.Undefined
+        and env.finalize is None
+        and not env.autoescape
+        and env.variable_start_string == "{{"
+        and env.variable_end_string == "}}"
+        and env.block_start_string == "{%"
+        and env.comment_start_string == "{#"
+        and env.line_statement_prefix is None
+        and env.line_comment_prefix is None
+        and env.newline_sequence == "\n"
+        and not env.keep_trailing_newline
+    )
+
+
+def _compile(env: jinja2.Environment, sql_file: str):
+    """
+    Returns a function rendering a template from a dict of variables, reused until the file changes.
+
+    Templates that only substitute variables are rendered with str.format_map, which skips
+    Jinja's context setup. Anything with blocks, filters, comments or whitespace control is
+    rendered by Jinja, as is every template from an environment with non-default settings.
+    """
+    cached = _templates.get((env, sql_file))
+    if cached and (cached[1] is None or cached[1]()):
+        return cached[0]
+
+    source, _, uptodate = env.loader.get_source(env, sql_file)
+    parts = _PLACEHOLDER_RE.split(source)
+    literals, names = parts[::2], parts[1::2]
+
+    if (
+        not _is_default_env(env)
+        or any(
+            "{{" in l or "{%" in l or "{#" in l or l.endswith("{") or l.startswith("}")
+            for l in literals
+        )
+        or any(name in _JINJA_CONSTANTS or name in env.globals for name in names)
+    ):
+        render = env.get_template(sql_file).render
+    else:
+        # Jinja normalises newlines and drops a single trailing newline
+        parts[::2] = [
+            l.replace("\r\n", "\n")
+            .replace("\r", "\n")
+            .replace("{", "{{")
+            .replace("}", "}}")
+            for l in literals
+        ]
+        # Jinja renders values with str(), not format()
+        parts[1::2] = ["{" + name + "!s}" for name in names]
+        template = "".join(parts)
+        if template.endswith("\n"):
+            template = template[:-1]
+
+        def render(variables):
+            return template.format_map(_Blank(variables))
+
+    _templates[(env, sql_file)] = (render, uptodate)
+    return render
+
 
 class BaseConnector(ABC):
     def __init__(self, path: str, credentials: dict):
@@ -15,7 +99,7 @@ class BaseConnector(ABC):
 
     @abstractmethod
     def _set_path(self):
-        return jinja2.Environment(loader=jinja2.FileSystemLoader(self._path))
+        return get_environment(self._path)
 
     @abstractmethod
     def _read_query(self, sql_file: str, **kwargs) -> str:
@@ -28,7 +112,7 @@ class BaseConnector(ABC):
         Returns:
             query: parsed SQL script.
         """
-        sql = self._sql.get_template(sql_file).render(kwargs)
+        sql = _compile(self._sql, sql_file)(kwargs)
         return sql
 
     @abstractmethod
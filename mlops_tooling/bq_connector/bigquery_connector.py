@@ -1,20 +1,64 @@
 from mlops_tooling.bq_connector.base_class import BaseConnector
-from google.cloud import bigquery
+from google.cloud import bigquery, bigquery_storage
 from pathlib import Path
-import re
+import copy
+import hashlib
+import io
+import os
+import tempfile
+import time
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
-try:
-    CONFIG_DIR = (
-        re.findall("^(\/[^\/]*\/[^\/]*\/)\/?", str(Path().absolute()))[0]
-        + ".config/gcloud/prod.json"
-    )
-except:
+_CWD = Path.cwd()
+
+# Credentials are kept in the home folder the notebook runs from, e.g. /home/jupyter/.config/gcloud/prod.json
+if len(_CWD.parts) > 3:
+    CONFIG_DIR = str(Path(*_CWD.parts[:3]) / ".config" / "gcloud" / "prod.json")
+else:
     CONFIG_DIR = "./"
 
-try:
-    SQL_DIR = str(Path().absolute().parent) + "/sql"
-except:
-    SQL_DIR = "./sql"
+SQL_DIR = str(_CWD.parent / "sql")
+
+CACHE_DIR = str(Path.home() / ".cache" / "mlops_tooling" / "bq")
+
+
+def _cache_path(sql: str, project: str, credentials: str) -> str:
+    """
+    Returns the location of the cached results for a rendered SQL query.
+
+    Unqualified table names resolve against the client's project, and what a query can see depends on
+    its credentials, so both are part of the key alongside the SQL.
+    """
+    key = "\0".join([project or "", credentials or "", sql])
+    digest = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+    return os.path.join(CACHE_DIR, f"{digest}.parquet")
+
+
+def _is_cached(path: str, cache_ttl: int = None) -> bool:
+    """
+    Checks whether cached results exist, and are younger than cache_ttl seconds if given.
+    """
+    if not os.path.exists(path):
+        return False
+
+    if cache_ttl is None:
+        return True
+
+    return time.time() - os.path.getmtime(path) < cache_ttl
+
+
+def _to_dataframe(table) -> pd.DataFrame:
+    """
+    Converts a pyarrow table or record batch to a dataframe backed by pyarrow dtypes.
+
+    Strings stay in Arrow's contiguous buffers rather than becoming Python objects, and nullable
+    integers keep their type. The Arrow buffers are released as each column is converted.
+    """
+    return table.to_pandas(
+        types_mapper=pd.ArrowDtype, self_destruct=True, split_blocks=True
+    )
 
 
 class BigQuery(BaseConnector):
@@ -24,6 +68,7 @@ class BigQuery(BaseConnector):
         super().__init__(path=self._path, credentials=self._credentials)
 
         self.Connector = self._instantiate_connection()
+        self.StorageConnector = self._instantiate_storage_connection()
 
     def _instantiate_connection(self):
         """
@@ -31,6 +76,14 @@ class BigQuery(BaseConnector):
         """
         return bigquery.Client.from_service_account_json(self._credentials)
 
+    def _instantiate_storage_connection(self):
+        """
+        Creates a BigQuery Storage API client, used to download query results as Arrow record batches.
+        """
+        return bigquery_storage.BigQueryReadClient(
+            credentials=self.Connector._credentials
+        )
+
     def _set_path(self):
         """
         Sets the path to the SQL files
@@ -65,12 +118,21 @@ class BigQuery(BaseConnector):
         Returns
         ----------
         table: pd.DataFrame
-            A pandas df of the output.
+            A pandas df of the output, backed by pyarrow dtypes.
         """
         sql = f"select * from {table_name}"
-        return self.Connector.query(sql).to_dataframe()
+        return _to_dataframe(
+            self.Connector.query(sql).to_arrow(bqstorage_client=self.StorageConnector)
+        )
 
-    def query(self, sql_file: str, create_bqstorage_client: bool = False, **kwargs):
+    def query(
+        self,
+        sql_file: str,
+        create_bqstorage_client: bool = True,
+        use_cache: bool = False,
+        cache_ttl: int = None,
+        **kwargs,
+    ):
         """
         Import a SQL script and output a dataframe of the results.
 
@@ -78,31 +140,144 @@ class BigQuery(BaseConnector):
         ----------
         file_name : str
             A filename of the SQL script.
+        create_bqstorage_client : bool, default True
+            Download the results through the BigQuery Storage API rather than the paginated REST API.
+        use_cache : bool, default False
+            Store the results as parquet in ~/.cache/mlops_tooling/bq, and reuse them when the same rendered query is run again.
+        cache_ttl : int, optional
+            The number of seconds cached results are valid for. By default cached results never expire.
 
         Returns
         ----------
         table: pd.DataFrame
-            A pandas df of the output.
+            A pandas df of the output, backed by pyarrow dtypes. String columns still support the .str accessor.
+        """
+        sql = self._read_query(sql_file, **kwargs)
+
+        if use_cache:
+            cache_path = _cache_path(sql, self.Connector.project, self._credentials)
+
+            if _is_cached(cache_path, cache_ttl):
+                return _to_dataframe(pq.read_table(cache_path, memory_map=True))
+
+        results = self.Connector.query(sql).to_arrow(
+            bqstorage_client=self.StorageConnector if create_bqstorage_client else None,
+            create_bqstorage_client=create_bqstorage_client,
+        )
+
+        if use_cache:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            # Write to a uniquely named temporary file first, so neither an interrupted write nor a
+            # concurrent one for the same query can leave a partial cache entry
+            with tempfile.NamedTemporaryFile(
+                dir=CACHE_DIR, suffix=".tmp", delete=False
+            ) as temp_file:
+                temp_path = temp_file.name
+
+            try:
+                pq.write_table(results, temp_path, compression="zstd")
+                os.replace(temp_path, cache_path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+
+        return _to_dataframe(results)
+
+    def query_arrow(self, sql_file: str, **kwargs):
+        """
+        Import a SQL script and output a pyarrow table of the results, skipping the conversion to pandas.
+
+        Parameters
+        ----------
+        file_name : str
+            A filename of the SQL script.
+
+        Returns
+        ----------
+        table: pa.Table
+            A pyarrow table of the output.
         """
         sql = self._read_query(sql_file, **kwargs)
-        return self.Connector.query(sql).to_dataframe(
-            create_bqstorage_client=create_bqstorage_client
+        return self.Connector.query(sql).to_arrow(
+            bqstorage_client=self.StorageConnector
         )
 
-    def write_query(self, table_id, dataset, job_config):
+    def query_rows(self, sql_file: str, page_size: int = None, **kwargs):
+        """
+        Import a SQL script and return a lazy iterator over the rows of the results.
+
+        Pages are only downloaded as the iterator is consumed, so loop over it with
+        `for row in rows:` rather than calling `list(rows)`. For Arrow record batches,
+        use `rows.to_arrow_iterable()`.
+
+        Parameters
+        ----------
+        file_name : str
+            A filename of the SQL script.
+        page_size : int, optional
+            The number of rows downloaded per page.
+
+        Returns
+        ----------
+        rows: google.cloud.bigquery.table.RowIterator
+            An iterator over the rows of the output.
+        """
+        sql = self._read_query(sql_file, **kwargs)
+        return self.Connector.query(sql).result(page_size=page_size)
+
+    def query_in_chunks(self, sql_file: str, chunk_size: int = None, **kwargs):
         """
-        Create a new table in BigQuery containing data from a Pandas DataFrame.
+        Import a SQL script and yield the results as a series of dataframes, without holding the full result in memory.
+
+        Parameters
+        ----------
+        file_name : str
+            A filename of the SQL script.
+        chunk_size : int, optional
+            The number of rows in each chunk. When set, results are paged through the REST API so the size is respected,
+            otherwise the BigQuery Storage API decides the size of each chunk.
+
+        Yields
+        ----------
+        table: pd.DataFrame
+            A pandas df of each chunk of the output, backed by pyarrow dtypes.
+        """
+        sql = self._read_query(sql_file, **kwargs)
+        results = self.Connector.query(sql).result(page_size=chunk_size)
+
+        for batch in results.to_arrow_iterable(
+            bqstorage_client=None if chunk_size else self.StorageConnector
+        ):
+            yield _to_dataframe(batch)
+
+    def write_query(self, table_id, dataset, job_config=None):
+        """
+        Create a new table in BigQuery containing data from a Pandas DataFrame or pyarrow Table.
 
         Parameters
         ----------
         table_id : str
             The name of the table to create/add to.
-        dataset : pd.DataFrame
-            The dataset to add the table to.
-        job_config : dict
-            A dictionary containing the configuration for the job. See Google Job Config documentation.
+        dataset : pd.DataFrame or pa.Table
+            The dataset to add the table to. pyarrow tables are written straight to parquet, skipping pandas.
+        job_config : bigquery.LoadJobConfig, optional
+            The configuration for the job. See Google Job Config documentation.
         """
-        job = self.Connector.load_table_from_dataframe(
-            dataset, table_id, job_config=job_config
-        )
+        if isinstance(dataset, pa.Table):
+            job_config = (
+                copy.deepcopy(job_config) if job_config else bigquery.LoadJobConfig()
+            )
+            job_config.source_format = bigquery.SourceFormat.PARQUET
+
+            buffer = io.BytesIO()
+            pq.write_table(dataset, buffer, compression="zstd")
+
+            job = self.Connector.load_table_from_file(
+                buffer, table_id, job_config=job_config, rewind=True
+            )
+        else:
+            job = self.Connector.load_table_from_dataframe(
+                dataset, table_id, job_config=job_config
+            )
+
         job.result()
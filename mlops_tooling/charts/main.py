@@ -8,99 +8,109 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
 
-def find_optimal_pr_threshold(y_true, y_scores):
+def find_optimal_pr_threshold(y_true, y_scores, show: bool = True):
     precision, recall, thresholds = precision_recall_curve(y_true, y_scores)
     no_skill = sum(y_true) / len(y_true)
 
-    f1_scores = 2 * (precision * recall) / (precision + recall + 1e-14)
-    optimal_threshold_index = f1_scores.argmax()
-    optimal_threshold = thresholds[optimal_threshold_index]
-
-    # Create figure
-    fig = go.Figure()
+    # Precision only rises along a run of equal recall, so keep the last point of each run
+    candidates = np.flatnonzero(np.diff(recall) != 0)
+    candidate_precision, candidate_recall = precision[candidates], recall[candidates]
 
-    # Plot Precision-Recall Curve
-    fig.add_trace(
-        go.Scatter(x=recall, y=precision, mode="lines", name="Precision-Recall Curve")
+    f1_scores = np.divide(
+        2 * candidate_precision * candidate_recall,
+        candidate_precision + candidate_recall,
+        out=np.zeros_like(candidate_precision),
+        where=(candidate_precision + candidate_recall) > 0,
     )
 
-    # Plot No Skill Curve
-    fig.add_trace(
-        go.Scatter(
-            x=np.arange(0, 1.01, 0.01),
-            y=[no_skill] * 101,
-            line=dict(color="grey", dash="dash"),
-            name="No skill",
-        )
-    )
+    # Take the middle of any plateau of equally good thresholds
+    ties = np.flatnonzero(f1_scores == f1_scores.max())
+    optimal_threshold_index = candidates[ties[len(ties) // 2]]
+    optimal_threshold = thresholds[optimal_threshold_index]
 
-    # Highlight optimal threshold point
-    fig.add_trace(
-        go.Scatter(
-            x=[recall[optimal_threshold_index]],
-            y=[precision[optimal_threshold_index]],
-            mode="markers",
-            marker=dict(color="red", symbol="circle", size=10),
-            name="Optimal Threshold",
+    if show:
+        # Build the figure in one call so plotly only validates it once
+        fig = go.Figure(
+            data=[
+                # Plot Precision-Recall Curve
+                go.Scatter(
+                    x=recall, y=precision, mode="lines", name="Precision-Recall Curve"
+                ),
+                # Plot No Skill Curve
+                go.Scatter(
+                    x=np.arange(0, 1.01, 0.01),
+                    y=np.full(101, no_skill),
+                    line=dict(color="grey", dash="dash"),
+                    name="No skill",
+                ),
+                # Highlight optimal threshold point
+                go.Scatter(
+                    x=[recall[optimal_threshold_index]],
+                    y=[precision[optimal_threshold_index]],
+                    mode="markers",
+                    marker=dict(color="red", symbol="circle", size=10),
+                    name="Optimal Threshold",
+                ),
+            ],
+            layout=go.Layout(
+                xaxis_title="Recall",
+                yaxis_title="Precision",
+                title="Precision-Recall Curve with Optimal Threshold",
+                showlegend=True,
+                template="simple_white",
+            ),
         )
-    )
-
-    fig.update_layout(
-        xaxis_title="Recall",
-        yaxis_title="Precision",
-        title="Precision-Recall Curve with Optimal Threshold",
-        showlegend=True,
-        template="simple_white",
-    )
 
-    fig.show()
+        fig.show()
 
     return optimal_threshold
 
 
-def find_optimal_auc_threshold(y_true, y_scores):
-    fpr, tpr, thresholds = roc_curve(y_true, y_scores, drop_intermediate=False)
-    youden_j = tpr - fpr
+def find_optimal_auc_threshold(y_true, y_scores, show: bool = True):
+    # Dropping collinear points leaves the vertices of the curve, where Youden's J is maximised
+    fpr, tpr, thresholds = roc_curve(y_true, y_scores, drop_intermediate=True)
 
-    optimal_threshold_index = youden_j.argmax()
-    optimal_threshold = thresholds[optimal_threshold_index]
+    # FPR only rises along a run of equal TPR, so keep the first point of each run
+    candidates = np.flatnonzero(np.r_[True, np.diff(tpr) != 0])
+    youden_j = tpr[candidates] - fpr[candidates]
 
-    # Create figure
-    fig = go.Figure()
-
-    # Plot Precision-Recall Curve
-    fig.add_trace(go.Scatter(x=fpr, y=tpr, mode="lines", name="ROC Curve"))
-
-    # Plot No Skill Curve
-    fig.add_trace(
-        go.Scatter(
-            x=np.arange(0, 1.01, 0.01),
-            y=np.arange(0, 1.01, 0.01),
-            line=dict(color="grey", dash="dash"),
-            name="No skill",
-        )
-    )
+    # Take the middle of any plateau of equally good thresholds
+    ties = np.flatnonzero(youden_j == youden_j.max())
+    optimal_threshold_index = candidates[ties[len(ties) // 2]]
+    optimal_threshold = thresholds[optimal_threshold_index]
 
-    # Highlight optimal threshold point
-    fig.add_trace(
-        go.Scatter(
-            x=[fpr[optimal_threshold_index]],
-            y=[tpr[optimal_threshold_index]],
-            mode="markers",
-            marker=dict(color="red", symbol="circle", size=10),
-            name="Optimal Threshold",
+    if show:
+        # Build the figure in one call so plotly only validates it once
+        fig = go.Figure(
+            data=[
+                # Plot ROC Curve
+                go.Scatter(x=fpr, y=tpr, mode="lines", name="ROC Curve"),
+                # Plot No Skill Curve
+                go.Scatter(
+                    x=np.arange(0, 1.01, 0.01),
+                    y=np.arange(0, 1.01, 0.01),
+                    line=dict(color="grey", dash="dash"),
+                    name="No skill",
+                ),
+                # Highlight optimal threshold point
+                go.Scatter(
+                    x=[fpr[optimal_threshold_index]],
+                    y=[tpr[optimal_threshold_index]],
+                    mode="markers",
+                    marker=dict(color="red", symbol="circle", size=10),
+                    name="Optimal Threshold",
+                ),
+            ],
+            layout=go.Layout(
+                xaxis_title="False positive rate",
+                yaxis_title="True positive rate",
+                title="ROC Curve with Optimal Threshold",
+                showlegend=True,
+                template="simple_white",
+            ),
         )
-    )
-
-    fig.update_layout(
-        xaxis_title="False positive rate",
-        yaxis_title="True positive rate",
-        title="ROC Curve with Optimal Threshold",
-        showlegend=True,
-        template="simple_white",
-    )
 
-    fig.show()
+        fig.show()
 
     return optimal_threshold
 
@@ -116,37 +126,34 @@ def create_area_chart(
     """
     Creates area chart for one variable.
     """
-    fig = go.Figure()
-
-    fig.add_trace(
-        go.Scatter(
+    fig = go.Figure(
+        data=go.Scatter(
             x=dataset[x],
             y=dataset[y],
             name=x,
             stackgroup="one",
             marker=dict(color="#46039f"),
-        )
-    )
-
-    fig.update_layout(
-        width=width,
-        height=height,
-        title=title,
-        xaxis=dict(
-            title_text=x,
-            type="linear",
-            tickangle=0,
-            ticklabelstep=1,
         ),
-        legend=dict(
-            title_text="",
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="left",
-            x=0.01,
+        layout=go.Layout(
+            width=width,
+            height=height,
+            title=title,
+            xaxis=dict(
+                title_text=x,
+                type="linear",
+                tickangle=0,
+                ticklabelstep=1,
+            ),
+            legend=dict(
+                title_text="",
+                orientation="h",
+                yanchor="bottom",
+                y=1.02,
+                xanchor="left",
+                x=0.01,
+            ),
+            template="simple_white",
         ),
-        template="simple_white",
     )
 
     return fig
@@ -168,26 +175,23 @@ def create_area_charts(
     """
     fig = make_subplots(rows=1, cols=2, subplot_titles=subtitles)
 
-    fig.add_trace(
-        go.Scatter(
-            x=dataset[x1],
-            y=dataset[y1],
-            stackgroup="one",
-            marker=dict(color="#46039f"),
-        ),
-        row=1,
-        col=1,
-    )
-
-    fig.add_trace(
-        go.Scatter(
-            x=dataset[x2],
-            y=dataset[y2],
-            stackgroup="one",
-            marker=dict(color="#46039f"),
-        ),
-        row=1,
-        col=2,
+    fig.add_traces(
+        [
+            go.Scatter(
+                x=dataset[x1],
+                y=dataset[y1],
+                stackgroup="one",
+                marker=dict(color="#46039f"),
+            ),
+            go.Scatter(
+                x=dataset[x2],
+                y=dataset[y2],
+                stackgroup="one",
+                marker=dict(color="#46039f"),
+            ),
+        ],
+        rows=[1, 1],
+        cols=[1, 2],
     )
 
     fig.update_layout(
@@ -211,48 +215,44 @@ def create_overlapping_area_charts(
     height: int = 600,
     width: int = 1200,
 ):
-    fig = go.Figure()
-
-    fig.add_trace(
-        go.Scatter(
-            x=dataset[x],
-            y=dataset[y1],
-            name=y1,
-            stackgroup="one",
-            marker=dict(color="#46039f"),
-        )
-    )
-
-    fig.add_trace(
-        go.Scatter(
-            x=dataset[x],
-            y=dataset[y2],
-            name=y2,
-            stackgroup="two",
-            marker=dict(color="#fb9f3a", size=0),
-        )
-    )
-
-    fig.update_layout(
-        width=width,
-        height=height,
-        title=title,
-        yaxis_title=y_title,
-        xaxis=dict(
-            title_text=x,
-            type="linear",
-            tickangle=0,
-            ticklabelstep=1,
-        ),
-        legend=dict(
-            title_text="",
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="left",
-            x=0.01,
+    fig = go.Figure(
+        data=[
+            go.Scatter(
+                x=dataset[x],
+                y=dataset[y1],
+                name=y1,
+                stackgroup="one",
+                marker=dict(color="#46039f"),
+            ),
+            go.Scatter(
+                x=dataset[x],
+                y=dataset[y2],
+                name=y2,
+                stackgroup="two",
+                marker=dict(color="#fb9f3a", size=0),
+            ),
+        ],
+        layout=go.Layout(
+            width=width,
+            height=height,
+            title=title,
+            yaxis_title=y_title,
+            xaxis=dict(
+                title_text=x,
+                type="linear",
+                tickangle=0,
+                ticklabelstep=1,
+            ),
+            legend=dict(
+                title_text="",
+                orientation="h",
+                yanchor="bottom",
+                y=1.02,
+                xanchor="left",
+                x=0.01,
+            ),
+            template="simple_white",
         ),
-        template="simple_white",
     )
 
     return fig
@@ -1,20 +1,213 @@
-import glob
+import base64
+import functools
+import importlib
 import os
-import re
-import uuid
+import tempfile
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from urllib.parse import urlsplit
 
+import google_crc32c
 import mlflow
 from google.cloud import aiplatform, storage
+from google.cloud.storage import transfer_manager
 from mlflow import MlflowClient
+from mlflow.entities import Metric, Param
+from mlflow.entities.model_registry import ModelVersion
 from mlflow.models.signature import infer_signature
+from requests.adapters import HTTPAdapter
 
 from mlops_tooling.logger.main import get_logger
 
 logger = get_logger(__name__)
 
+# Registered model metadata rarely changes, so lookups are reused for this many seconds
+MODEL_INFO_TTL = 60
+
+# Artifacts at least this large, e.g. saved model weights, are uploaded as parallel chunks
+LARGE_FILE_THRESHOLD = 32 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_CHUNK_WORKERS = 8
+# Each upload worker holds its own connection, so no more workers than this are run at once
+UPLOAD_POOL_SIZE = 32
+
+
+@functools.lru_cache(maxsize=None)
+def _flavour(model_type: str):
+    """
+    Returns the MLflow flavour module for a model type, e.g. mlflow.sklearn for "sklearn".
+    """
+    return importlib.import_module(f"mlflow.{model_type}")
+
+
+@functools.lru_cache(maxsize=None)
+def _default_credentials(proj: str) -> str:
+    """
+    Returns the gcloud credentials file for "dev" or "prod", found from the user's home folder.
+    """
+    home = Path(*Path.cwd().parts[:3])
+    return str(home / ".config" / "gcloud" / f"{proj}.json")
+
+
+def _log_batch(client: MlflowClient, run_id: str, parameters: dict, metrics: dict):
+    """
+    Logs parameters and metrics to a run in a single request, rather than one per call.
+    """
+    if not parameters and not metrics:
+        return
+
+    timestamp = int(time.time() * 1000)
+    client.log_batch(
+        run_id,
+        metrics=[
+            Metric(key, value, timestamp, 0) for key, value in (metrics or {}).items()
+        ],
+        params=[Param(key, str(value)) for key, value in (parameters or {}).items()],
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _storage_client(service_account: str, project: str) -> storage.Client:
+    """
+    Returns a GCS client for a service account, reused so its auth session and connections are kept.
+    """
+    client = storage.Client.from_service_account_json(
+        json_credentials_path=service_account, project=project
+    )
+    # The default pool holds 10 connections, fewer than the concurrent upload workers
+    adapter = HTTPAdapter(
+        pool_connections=UPLOAD_POOL_SIZE, pool_maxsize=UPLOAD_POOL_SIZE
+    )
+    client._http.mount("https://", adapter)
+    return client
+
+
+def _upload_folder(
+    bucket: storage.Bucket,
+    gcs_path: str,
+    local_path: str,
+    verify: bool = False,
+    max_workers: int = 16,
+):
+    """
+    Uploads every file under local_path to gcs_path in the bucket, keeping relative paths.
+
+    Files that already exist in the bucket with the same size and CRC32C are skipped.
+    Small files are uploaded concurrently as whole objects, while files of at least
+    LARGE_FILE_THRESHOLD bytes are split into chunks that are uploaded in parallel.
+    Upload checksums are only computed and checked when verify is set.
+    max_workers is capped at UPLOAD_POOL_SIZE, the size of the client's connection pool.
+    """
+    if max_workers > UPLOAD_POOL_SIZE:
+        logger.warning(
+            f"Capping max_workers at {UPLOAD_POOL_SIZE}, the size of the connection pool"
+        )
+        max_workers = UPLOAD_POOL_SIZE
+
+    existing = {
+        blob.name: blob
+        for blob in bucket.list_blobs(
+            prefix=gcs_path + "/", fields="items(name,size,crc32c),nextPageToken"
+        )
+    }
+    small_files, large_files = [], []
+    skipped = 0
+    stack = [""]
+
+    # DirEntry caches the file type from the directory read, saving a stat per entry
+    while stack:
+        folder = stack.pop()
+        with os.scandir(os.path.join(local_path, folder)) as entries:
+            for entry in entries:
+                filename = f"{folder}/{entry.name}" if folder else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(filename)
+                elif entry.is_file():
+                    size = entry.stat().st_size
+                    blob = existing.get(f"{gcs_path}/{filename}")
+                    if (
+                        blob
+                        and blob.size == size
+                        and blob.crc32c == _crc32c(entry.path)
+                    ):
+                        skipped += 1
+                    elif size >= LARGE_FILE_THRESHOLD:
+                        large_files.append(filename)
+                    else:
+                        small_files.append(filename)
+
+    logger.info(
+        f"Writing {len(small_files) + len(large_files)} files from {local_path} to {gcs_path}, "
+        f"skipping {skipped} unchanged"
+    )
+
+    # Uploads run concurrently, so many small artifact files are not serialised on round trips
+    transfer_manager.upload_many_from_filenames(
+        bucket,
+        small_files,
+        source_directory=local_path,
+        blob_name_prefix=gcs_path + "/",
+        upload_kwargs={"timeout": 600, "checksum": "crc32c" if verify else None},
+        max_workers=max_workers,
+        worker_type=transfer_manager.THREAD,
+        raise_exception=True,
+    )
+
+    for filename in large_files:
+        transfer_manager.upload_chunks_concurrently(
+            os.path.join(local_path, filename),
+            bucket.blob(f"{gcs_path}/{filename}"),
+            chunk_size=UPLOAD_CHUNK_SIZE,
+            max_workers=UPLOAD_CHUNK_WORKERS,
+            worker_type=transfer_manager.THREAD,
+            checksum="md5" if verify else None,
+            timeout=600,
+        )
+        logger.info(f"Wrote {filename} to {gcs_path} in chunks")
+
+
+def _crc32c(filename: str) -> str:
+    """
+    Returns the base64 CRC32C of a local file, in the same form as Blob.crc32c.
+    """
+    checksum = google_crc32c.Checksum()
+
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            checksum.update(block)
+
+    return base64.b64encode(checksum.digest()).decode("utf-8")
+
+
+def _log_upload_error(run_id: str, upload: Future):
+    """
+    Logs the error of a failed background model upload, which would otherwise only surface from wait_for_uploads.
+    """
+    if upload.exception():
+        logger.error(
+            f"Background model upload for run {run_id} failed: {upload.exception()}"
+        )
+
+
+def _parent_model(display_name: str, google_project: str, api_location: str):
+    """
+    Returns the resource name of the latest Vertex AI model with a display name, or None if there isn't one.
+    """
+    models = aiplatform.Model.list(
+        filter=f'display_name="{display_name}"',
+        order_by="update_time desc",
+        project=google_project,
+        location=api_location,
+    )
+
+    return models[0].resource_name if models else None
+
 
 class ModelManager:
+    # Set to True to checksum artifact uploads, at the cost of hashing every file
+    verify_uploads = False
+
     def __init__(
         self,
         tracking_uri: str,
@@ -23,6 +216,36 @@ class ModelManager:
         google_credentials: str = None,
         api_location: str = "europe-west2",
         api_endpoint: str = "europe-west2-aiplatform.googleapis.com",
+    ):
+        self._setup(
+            tracking_uri,
+            google_project,
+            gcs_bucket,
+            google_credentials,
+            api_location,
+            api_endpoint,
+        )
+
+        mlflow.set_tracking_uri(tracking_uri)
+        aiplatform.init(project=self.google_project, location=self.api_location)
+
+    @classmethod
+    def _without_globals(cls, *args):
+        """
+        Builds a manager without pointing the process-wide MLflow tracking URI and aiplatform config at it.
+        """
+        manager = cls.__new__(cls)
+        manager._setup(*args)
+        return manager
+
+    def _setup(
+        self,
+        tracking_uri: str,
+        google_project: str,
+        gcs_bucket: str,
+        google_credentials: str = None,
+        api_location: str = "europe-west2",
+        api_endpoint: str = "europe-west2-aiplatform.googleapis.com",
     ):
         self.tracking_uri = tracking_uri
         self.google_project = google_project
@@ -32,14 +255,14 @@ class ModelManager:
 
         if google_credentials:
             self.google_credentials = google_credentials
+            os.environ.setdefault("GOOGLE_APPLICATION_CREDENTIALS", google_credentials)
         else:
             self.google_credentials = self.set_google_credentials(self.google_project)
-
-        self.set_google_credentials(self.google_credentials)
-        mlflow.set_tracking_uri(tracking_uri)
-        self.mlflow_client = MlflowClient()
-
-        aiplatform.init(project=self.google_project, location=self.api_location)
+        self.mlflow_client = MlflowClient(tracking_uri)
+        self._model_info_cache = {}
+        self._experiment_cache = {}
+        self._upload_pool = ThreadPoolExecutor(max_workers=4)
+        self._uploads = []
 
     @staticmethod
     def set_google_credentials(project):
@@ -52,15 +275,10 @@ class ModelManager:
             else:
                 proj = "prod"
 
-            google_credentials = (
-                re.findall("^(\/[^\/]*\/[^\/]*\/)\/?", str(Path().absolute()))[0]
-                + f".config/gcloud/{proj}.json"
+            return os.environ.setdefault(
+                "GOOGLE_APPLICATION_CREDENTIALS", _default_credentials(proj)
             )
 
-            os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = google_credentials
-
-            return google_credentials
-
     def model_info(self, model_name: str):
         """
         Pulls information about a model from MLflow.
@@ -75,9 +293,30 @@ class ModelManager:
         model_info : dict
             A dictionary containing information about the model.
         """
+        cached = self._model_info_cache.get(model_name)
+
+        if cached and time.monotonic() - cached[0] < MODEL_INFO_TTL:
+            return cached[1]
+
         model_info = self.mlflow_client.get_registered_model(model_name)
+        self._model_info_cache[model_name] = (time.monotonic(), model_info)
+
         return model_info
 
+    def invalidate_model_info(self, model_name: str = None):
+        """
+        Drops cached model information, e.g. after registering a new version of a model.
+
+        Parameters
+        ----------
+        model_name : str, optional
+            The name of the model to drop. All cached models are dropped if this isn't given.
+        """
+        if model_name is None:
+            self._model_info_cache.clear()
+        else:
+            self._model_info_cache.pop(model_name, None)
+
     def model_location(self, model_type: str):
         if model_type == "tensorflow":
             return "/data/model"
@@ -108,12 +347,19 @@ class ModelManager:
         model_info = self.model_info(model_name)
         model_versions = model_info.latest_versions
 
-        uri_snippet = re.search(
-            ".+:(.+)",
-            list(filter(lambda x: x.current_stage == model_stage, model_versions))[
-                0
-            ].source,
-        )[1]
+        versions_by_stage = {v.current_stage: v for v in model_versions}
+
+        if model_stage not in versions_by_stage:
+            raise KeyError(f"{model_name} has no version in stage {model_stage}")
+
+        model_version = versions_by_stage[model_stage]
+        return self._model_uri_from_source(model_version.source, model_type)
+
+    def _model_uri_from_source(self, source: str, model_type: str = "sklearn"):
+        """
+        Builds the Google Cloud URI of a model from its MLflow source, e.g. "mlflow-artifacts:/1/abc/artifacts/model".
+        """
+        uri_snippet = source.rpartition(":")[2]
 
         model_location = self.model_location(model_type=model_type)
         model_uri = self.gcs_bucket + "/mlflow" + uri_snippet + model_location
@@ -127,6 +373,8 @@ class ModelManager:
         model_type: str = "sklearn",
         model_stage: str = "Production",
         serving_container_image_uri: str = "europe-docker.pkg.dev/vertex-ai/prediction/sklearn-cpu.1-0:latest",
+        model_version: ModelVersion = None,
+        as_new_version: bool = False,
     ):
         """
         Uploads an MLflow model to a Vertex AI, allowing it to be attached to an endpoint.
@@ -141,6 +389,10 @@ class ModelManager:
             Chosen name of the model, which will be displayed in Vertex AI. This defaults to the model name.
         model_stage : str
             The stage of the model to upload. Can be production or staging.
+        model_version : ModelVersion, optional
+            An MLflow model version that is already known, e.g. from registering it, which skips the registry lookup.
+        as_new_version : bool, default False
+            Whether to upload the model as a new version of an existing Vertex AI model with the same display name.
 
         Returns
         ----------
@@ -150,27 +402,37 @@ class ModelManager:
         assert model_stage in ["Staging", "Production"]
         model_display_name = model_display_name if model_display_name else model_name
 
-        model_uri = self.model_uri(
-            model_name=model_name, model_stage=model_stage, model_type=model_type
-        )
+        if model_version:
+            model_uri = self._model_uri_from_source(model_version.source, model_type)
+        else:
+            ## Deploying a stale version would be silent, so the registry is always read here
+            self.invalidate_model_info(model_name)
+            model_uri = self.model_uri(
+                model_name=model_name, model_stage=model_stage, model_type=model_type
+            )
+
+        if as_new_version:
+            parent_model = _parent_model(
+                model_display_name, self.google_project, self.api_location
+            )
+        else:
+            parent_model = None
 
         model = aiplatform.Model.upload(
             display_name=model_display_name,
             description=model_description,
             artifact_uri=model_uri,
             serving_container_image_uri=serving_container_image_uri,
+            parent_model=parent_model,
+            project=self.google_project,
+            location=self.api_location,
             sync=True,
         )
 
         model.wait()
 
         model_vertex_id = model.name
-        model_url = (
-            "projects/"
-            + self.google_project
-            + "/locations/europe-west2/models/"
-            + model_vertex_id
-        )
+        model_url = f"projects/{self.google_project}/locations/{self.api_location}/models/{model_vertex_id}"
 
         return model_url
 
@@ -194,14 +456,15 @@ class ModelManager:
             location=self.api_location,
         )
 
-        endpoint_id = re.search(".+/endpoints/(\d+)$", endpoint.resource_name)[1]
-
-        return endpoint_id
+        return endpoint.name
 
     def deploy_model(self, model_url: str, endpoint_id: str):
         """
         Deploys a model in Vertex AI to a Vertex AI endpoint.
 
+        The deployment carries on in the background. Call .result() on the returned
+        long-running operation to wait for it to finish.
+
         Parameters
         ----------
         model_url : str
@@ -237,6 +500,8 @@ class ModelManager:
             traffic_split=traffic_split,
         )
 
+        return response
+
     def serve_model(
         self,
         model_name: str,
@@ -245,6 +510,8 @@ class ModelManager:
         model_type: str = "sklearn",
         model_stage: str = "Production",
         serving_container_image_uri: str = "europe-docker.pkg.dev/vertex-ai/prediction/sklearn-cpu.1-0:latest",
+        model_version: ModelVersion = None,
+        as_new_version: bool = False,
     ):
         """
         Uploads an MLflow model to a Vertex AI, creates an endpoint for the model,
@@ -260,16 +527,39 @@ class ModelManager:
             Chosen name of the model, which will be displayed in Vertex AI. This defaults to the model name.
         model_stage : str
             The stage of the model to upload. Can be production or staging.
+        model_version : ModelVersion, optional
+            An MLflow model version that is already known, e.g. from registering it, which skips the registry lookup.
+        as_new_version : bool, default False
+            Whether to upload the model as a new version of an existing Vertex AI model with the same display name.
         """
-        model_url = self.upload_model(
-            model_name,
-            model_description,
-            model_display_name,
-            model_type,
-            model_stage,
-            serving_container_image_uri,
-        )
-        endpoint_id = self.create_model_endpoint(model_name)
+        # The endpoint does not depend on the model, so it is created while the upload runs
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            model_future = executor.submit(
+                self.upload_model,
+                model_name,
+                model_description,
+                model_display_name,
+                model_type,
+                model_stage,
+                serving_container_image_uri,
+                model_version,
+                as_new_version,
+            )
+            endpoint_future = executor.submit(self.create_model_endpoint, model_name)
+
+            try:
+                model_url = model_future.result()
+            except Exception:
+                ## Don't leave an empty endpoint behind when the upload fails
+                if endpoint_future.exception() is None:
+                    aiplatform.Endpoint(
+                        endpoint_future.result(),
+                        project=self.google_project,
+                        location=self.api_location,
+                    ).delete()
+                raise
+
+            endpoint_id = endpoint_future.result()
 
         self.deploy_model(model_url, endpoint_id)
 
@@ -282,8 +572,23 @@ class ModelManager:
         experiment_name : str
             The name of the experiment to create in MLflow.
         """
-        mlflow.create_experiment(experiment_name)
+        self._experiment_cache[experiment_name] = self.mlflow_client.create_experiment(
+            experiment_name
+        )
+
+    def _experiment_id(self, experiment_name: str) -> str:
+        # Resolved once per experiment, creating it if it doesn't exist yet
+        if experiment_name not in self._experiment_cache:
+            experiment = self.mlflow_client.get_experiment_by_name(experiment_name)
+
+            if experiment:
+                self._experiment_cache[experiment_name] = experiment.experiment_id
+            else:
+                self.create_new_experiment(experiment_name)
 
+        return self._experiment_cache[experiment_name]
+
+    @staticmethod
     def get_signature(model, X):
         signature = infer_signature(X, model.predict(X))
 
@@ -301,6 +606,7 @@ class ModelManager:
         model_type: str = "sklearn",
         override_model_artifacts: bool = False,
         model_artifact_folder: str = None,
+        background_upload: bool = False,
     ):
         """
         Logs a model to MLflow.
@@ -319,44 +625,40 @@ class ModelManager:
             A dictionary of model metrics, which will be saved to MLflow.
         model_type : str, default "sklearn"
             The type of the model to save, usually sklearn, however this can be lightgbm, xgboost, etc.
+        background_upload : bool, default False
+            Whether to upload overridden model artifacts in the background, so training can carry on.
+            Call wait_for_uploads to wait for them and raise any upload errors.
         """
-        mlflow.set_experiment(experiment_name)
+        mlflow.set_tracking_uri(self.tracking_uri)
+        experiment_id = self._experiment_id(experiment_name)
         # artifact_uri = mlflow.get_artifact_uri()
         # mlflow.get_
         # logger.info(artifact_uri)
+        upload_args = None
 
-        with mlflow.start_run(run_name=run_name) as run:
-            mlflow.set_tag("mlflow.runName", run_name)
-
-            if parameters:
-                mlflow.log_params(parameters)
-
-            if metrics:
-                mlflow.log_metrics(metrics)
+        with mlflow.start_run(run_name=run_name, experiment_id=experiment_id) as run:
+            _log_batch(self.mlflow_client, run.info.run_id, parameters, metrics)
 
             if override_model_artifacts:
                 gcs_uri = mlflow.get_artifact_uri()
+                temp_dir = None
 
                 if not model_artifact_folder:
-                    sha = str(uuid.uuid4().hex)
-                    ## this dumps our model to a model folder
-                    model_artifact_folder = f"mlflow-models/{sha}"
+                    ## this dumps our model to a temporary folder, which is removed once uploaded
+                    temp_dir = tempfile.TemporaryDirectory(prefix="mlflow-models-")
+                    model_artifact_folder = os.path.join(temp_dir.name, "model")
                     logger.info(
                         f"Saving model to the following folder: {model_artifact_folder}"
                     )
-                    eval(
-                        f"mlflow.{model_type}.save_model(model, '{model_artifact_folder}')"
-                    )
-
-                mlflow.end_run()
+                    _flavour(model_type).save_model(model, model_artifact_folder)
 
-                ## The above returns a URI like so: 'gs://bucket/mlflow/experiment_id/run_id/artifacts'
-                ## We remove the gs://bucket from it and add in /run_name/model/data to the end to ensure our folder ends up in the correct place.
-                gcs_uri = "mlflow/" + "/".join(gcs_uri.split(":/")[1:]) + "/" + run_name
+                ## The above returns a URI like so: 'mlflow-artifacts:/experiment_id/run_id/artifacts'
+                ## We keep its path, which sits under mlflow/ in the bucket, and add /run_name to the end to ensure our folder ends up in the correct place.
+                gcs_uri = f"mlflow{urlsplit(gcs_uri).path}/{run_name}"
 
                 logger.info(f"Overriding to the following uri: {gcs_uri}")
 
-                self.override_upload_artifacts(
+                upload_args = (
                     self.google_credentials,
                     self.google_project,
                     self.gcs_bucket.split("//")[1],
@@ -364,16 +666,48 @@ class ModelManager:
                     model_artifact_folder,
                 )
 
-                logger.info("Model uploaded.")
-
             else:
                 if artifacts:
-                    mlflow.log_artifacts(artifacts)
+                    self.mlflow_client.log_artifacts(run.info.run_id, artifacts)
 
-                eval(f"mlflow.{model_type}.log_model(model, '{run_name}')")
+                _flavour(model_type).log_model(model, run_name)
+
+        # The run is closed by the with block, so the upload happens once it has ended
+        if upload_args:
+            if background_upload:
+                upload = self._upload_pool.submit(
+                    self._upload_model_artifacts, upload_args, temp_dir
+                )
+                ## The run is already finished, so a failure is logged even if nobody waits for it
+                upload.add_done_callback(
+                    functools.partial(_log_upload_error, run.info.run_id)
+                )
+                self._uploads.append(upload)
+                logger.info("Model upload started in the background.")
+            else:
+                self._upload_model_artifacts(upload_args, temp_dir)
+                logger.info("Model uploaded.")
 
         return run.info.run_id
 
+    def _upload_model_artifacts(
+        self, upload_args: tuple, temp_dir: tempfile.TemporaryDirectory = None
+    ):
+        try:
+            self.override_upload_artifacts(*upload_args)
+        finally:
+            if temp_dir:
+                temp_dir.cleanup()
+
+    def wait_for_uploads(self):
+        """
+        Waits for background model uploads started by log_results, raising the first upload error.
+        """
+        uploads, self._uploads = self._uploads, []
+
+        for upload in uploads:
+            upload.result()
+
     def override_upload_artifacts(
         self,
         service_account: str,
@@ -381,6 +715,7 @@ class ModelManager:
         bucket_name: str,
         gcs_path: str,
         local_path: str,
+        max_workers: int = 16,
     ):
         """
         Uploads a local folder to GCS.
@@ -391,29 +726,13 @@ class ModelManager:
             bucket_name (str): Name of the bucket your want to upload to, e.g. "uw-example-bucket"
             gcs_path (str): Name of the location in the bucket you want to save to , e.g. "model-1"
             local_path (str): Folder name to upload.
+            max_workers (int): Number of files to upload at once, at most UPLOAD_POOL_SIZE.
         """
-        client = storage.Client.from_service_account_json(
-            json_credentials_path=service_account, project=project
-        )
-        bucket = client.bucket(bucket_name)
+        bucket = _storage_client(service_account, project).bucket(bucket_name)
 
         assert os.path.isdir(local_path)
 
-        for local_file in glob.glob(local_path + "/**"):
-            if not os.path.isfile(local_file):
-                logger.info(f"Found folder {local_file}, writing to to {gcs_path}")
-                self.override_upload_artifacts(
-                    service_account,
-                    project,
-                    bucket_name,
-                    gcs_path + "/" + os.path.basename(local_file),
-                    local_file,
-                )
-            else:
-                filename = local_file.split("/")[-1]
-                blob = bucket.blob(gcs_path + "/" + filename)
-                blob.upload_from_filename(local_file, timeout=600)
-                logger.info(f"Wrote object to {gcs_path}")
+        _upload_folder(bucket, gcs_path, local_path, self.verify_uploads, max_workers)
 
 
 class DualModelManager:
@@ -445,22 +764,51 @@ class DualModelManager:
 
         self.set_google_credentials(self.google_credentials)
 
-        self.dev_mlflow_client = MlflowClient(uri=self.dev_tracking_uri)
-        self.prod_mlflow_client = MlflowClient(uri=self.prod_tracking_uri)
+        # Each environment has its own manager, so tracking URIs, projects and buckets never mix.
+        # Neither is made the process-wide default, as every call picks its environment explicitly
+        self.dev_manager = ModelManager._without_globals(
+            dev_tracking_uri,
+            dev_google_project,
+            dev_gcs_bucket,
+            google_credentials,
+            api_location,
+            api_endpoint,
+        )
+        self.prod_manager = ModelManager._without_globals(
+            prod_tracking_uri,
+            prod_google_project,
+            prod_gcs_bucket,
+            google_credentials,
+            api_location,
+            api_endpoint,
+        )
+
+        self.dev_mlflow_client = self.dev_manager.mlflow_client
+        self.prod_mlflow_client = self.prod_manager.mlflow_client
+
+    @property
+    def verify_uploads(self):
+        return self.dev_manager.verify_uploads
+
+    @verify_uploads.setter
+    def verify_uploads(self, verify_uploads: bool):
+        self.dev_manager.verify_uploads = verify_uploads
+        self.prod_manager.verify_uploads = verify_uploads
+
+    def _manager(self, environment: str = "dev") -> ModelManager:
+        if environment == "dev":
+            return self.dev_manager
+        else:
+            return self.prod_manager
 
     @staticmethod
     def _set_ai_platform(google_project, api_location):
         aiplatform.init(project=google_project, location=api_location)
 
     def set_ai_platform(self, environment: str = "dev"):
-        api_location = self.api_location
+        manager = self._manager(environment)
 
-        if environment == "dev":
-            google_project = self.dev_google_project
-        else:
-            google_project = self.prod_google_project
-
-        self._set_ai_platform(google_project, api_location)
+        self._set_ai_platform(manager.google_project, manager.api_location)
 
     def set_google_credentials(self, project):
         os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = self.google_credentials
@@ -468,10 +816,7 @@ class DualModelManager:
         return self.google_credentials
 
     def _mlflow_client(self, environment: str = "dev"):
-        if environment == "dev":
-            return self.dev_mlflow_client
-        else:
-            return self.prod_mlflow_client
+        return self._manager(environment).mlflow_client
 
     def model_info(self, model_name: str, environment: str = "dev"):
         """
@@ -487,16 +832,29 @@ class DualModelManager:
         model_info : dict
             A dictionary containing information about the model.
         """
-        client = self._mlflow_client(environment)
-        model_info = client.get_registered_model(model_name)
+        return self._manager(environment).model_info(model_name)
 
-        return model_info
+    def invalidate_model_info(self, model_name: str = None, environment: str = None):
+        """
+        Drops cached model information, e.g. after registering a new version of a model.
 
-    def model_location(self, model_type: str):
-        if model_type == "tensorflow":
-            return "/data/model"
+        Parameters
+        ----------
+        model_name : str, optional
+            The name of the model to drop. All cached models are dropped if this isn't given.
+        environment : str, optional
+            The environment to drop the model from. Both environments are dropped if this isn't given.
+        """
+        if environment is None:
+            managers = [self.dev_manager, self.prod_manager]
         else:
-            return ""
+            managers = [self._manager(environment)]
+
+        for manager in managers:
+            manager.invalidate_model_info(model_name)
+
+    def model_location(self, model_type: str):
+        return self.dev_manager.model_location(model_type)
 
     def model_uri(
         self,
@@ -520,26 +878,12 @@ class DualModelManager:
         model_uri : str
             The Google Cloud Storage URI for the model.
         """
-        model_info = self.model_info(model_name, environment)
-        model_versions = model_info.latest_versions
-
-        uri_snippet = re.search(
-            ".+:(.+)",
-            list(filter(lambda x: x.current_stage == model_stage, model_versions))[
-                0
-            ].source,
-        )[1]
-
-        model_location = self.model_location(model_type=model_type)
-
-        if environment == "dev":
-            gcs_bucket = self.dev_gcs_bucket
-        else:
-            gcs_bucket = self.prod_gcs_bucket
-
-        model_uri = gcs_bucket + "/mlflow" + uri_snippet + model_location
+        return self._manager(environment).model_uri(model_name, model_type, model_stage)
 
-        return model_uri
+    def _model_uri_from_source(
+        self, source: str, model_type: str = "sklearn", environment: str = "dev"
+    ):
+        return self._manager(environment)._model_uri_from_source(source, model_type)
 
     def upload_model(
         self,
@@ -550,6 +894,8 @@ class DualModelManager:
         model_stage: str = "Production",
         environment: str = "dev",
         serving_container_image_uri: str = "europe-docker.pkg.dev/vertex-ai/prediction/sklearn-cpu.1-0:latest",
+        model_version: ModelVersion = None,
+        as_new_version: bool = False,
     ):
         """
         Uploads an MLflow model to a Vertex AI, allowing it to be attached to an endpoint.
@@ -564,49 +910,27 @@ class DualModelManager:
             Chosen name of the model, which will be displayed in Vertex AI. This defaults to the model name.
         model_stage : str
             The stage of the model to upload. Can be production or staging.
+        model_version : ModelVersion, optional
+            An MLflow model version that is already known, e.g. from registering it, which skips the registry lookup.
+        as_new_version : bool, default False
+            Whether to upload the model as a new version of an existing Vertex AI model with the same display name.
 
         Returns
         ----------
         model_url : str
             The Vertex AI url for the model.
         """
-        assert model_stage in ["Staging", "Production"]
-        model_display_name = model_display_name if model_display_name else model_name
-
-        model_uri = self.model_uri(
-            model_name=model_name,
-            model_stage=model_stage,
-            model_type=model_type,
-            environment=environment,
-        )
-
-        self.set_ai_platform(environment)
-
-        model = aiplatform.Model.upload(
-            display_name=model_display_name,
-            description=model_description,
-            artifact_uri=model_uri,
-            serving_container_image_uri=serving_container_image_uri,
-            sync=True,
-        )
-
-        model.wait()
-
-        if environment == "dev":
-            google_project = self.dev_google_project
-        else:
-            google_project = self.prod_google_project
-
-        model_vertex_id = model.name
-        model_url = (
-            "projects/"
-            + google_project
-            + "/locations/europe-west2/models/"
-            + model_vertex_id
+        return self._manager(environment).upload_model(
+            model_name,
+            model_description,
+            model_display_name,
+            model_type,
+            model_stage,
+            serving_container_image_uri,
+            model_version,
+            as_new_version,
         )
 
-        return model_url
-
     def create_model_endpoint(self, model_name: str, environment: str = "dev"):
         """
         Creates a Vertex AI endpoint for a model in MLflow.
@@ -621,22 +945,15 @@ class DualModelManager:
         endpoint_id : str
             The Vertex AI endpoint ID for the model.
         """
-        self.set_ai_platform(environment)
-
-        endpoint = aiplatform.Endpoint.create(
-            display_name=model_name,
-            project=self.google_project,
-            location=self.api_location,
-        )
-
-        endpoint_id = re.search(".+/endpoints/(\d+)$", endpoint.resource_name)[1]
-
-        return endpoint_id
+        return self._manager(environment).create_model_endpoint(model_name)
 
     def deploy_model(self, model_url: str, endpoint_id: str, environment: str = "dev"):
         """
         Deploys a model in Vertex AI to a Vertex AI endpoint.
 
+        The deployment carries on in the background. Call .result() on the returned
+        long-running operation to wait for it to finish.
+
         Parameters
         ----------
         model_url : str
@@ -644,40 +961,7 @@ class DualModelManager:
         endpoint_id : str
             The Vertex AI endpoint ID for the model to be deployed to.
         """
-        self.set_ai_platform(environment)
-
-        client_options = {"api_endpoint": self.api_endpoint}
-
-        client = aiplatform.gapic.EndpointServiceClient(client_options=client_options)
-
-        deployed_model = {
-            "model": model_url,
-            "dedicated_resources": {
-                "min_replica_count": 1,
-                "machine_spec": {
-                    "machine_type": "n1-standard-2",
-                },
-            },
-        }
-
-        traffic_split = {"0": 100}
-
-        if environment == "dev":
-            google_project = self.dev_google_project
-        else:
-            google_project = self.prod_google_project
-
-        endpoint = client.endpoint_path(
-            project=google_project,
-            location=self.api_location,
-            endpoint=endpoint_id,
-        )
-
-        response = client.deploy_model(
-            endpoint=endpoint,
-            deployed_model=deployed_model,
-            traffic_split=traffic_split,
-        )
+        return self._manager(environment).deploy_model(model_url, endpoint_id)
 
     def serve_model(
         self,
@@ -688,6 +972,8 @@ class DualModelManager:
         model_stage: str = "Production",
         environment: str = "dev",
         serving_container_image_uri: str = "europe-docker.pkg.dev/vertex-ai/prediction/sklearn-cpu.1-0:latest",
+        model_version: ModelVersion = None,
+        as_new_version: bool = False,
     ):
         """
         Uploads an MLflow model to a Vertex AI, creates an endpoint for the model,
@@ -703,19 +989,21 @@ class DualModelManager:
             Chosen name of the model, which will be displayed in Vertex AI. This defaults to the model name.
         model_stage : str
             The stage of the model to upload. Can be production or staging.
+        model_version : ModelVersion, optional
+            An MLflow model version that is already known, e.g. from registering it, which skips the registry lookup.
+        as_new_version : bool, default False
+            Whether to upload the model as a new version of an existing Vertex AI model with the same display name.
         """
-        model_url = self.upload_model(
+        return self._manager(environment).serve_model(
             model_name,
             model_description,
             model_display_name,
             model_type,
             model_stage,
-            environment,
             serving_container_image_uri,
+            model_version,
+            as_new_version,
         )
-        endpoint_id = self.create_model_endpoint(model_name, environment)
-
-        self.deploy_model(model_url, endpoint_id, environment)
 
     def create_new_experiment(self, experiment_name, environment: str = "dev"):
         """
@@ -726,13 +1014,11 @@ class DualModelManager:
         experiment_name : str
             The name of the experiment to create in MLflow.
         """
-        client = self._mlflow_client(environment)
-        client.create_experiment(experiment_name)
+        self._manager(environment).create_new_experiment(experiment_name)
 
+    @staticmethod
     def get_signature(model, X):
-        signature = infer_signature(X, model.predict(X))
-
-        return signature
+        return ModelManager.get_signature(model, X)
 
     def log_results(
         self,
@@ -747,6 +1033,7 @@ class DualModelManager:
         override_model_artifacts: bool = False,
         model_artifact_folder: str = None,
         environment: str = "dev",
+        background_upload: bool = False,
     ):
         """
         Logs a model to MLflow.
@@ -765,66 +1052,30 @@ class DualModelManager:
             A dictionary of model metrics, which will be saved to MLflow.
         model_type : str, default "sklearn"
             The type of the model to save, usually sklearn, however this can be lightgbm, xgboost, etc.
+        background_upload : bool, default False
+            Whether to upload overridden model artifacts in the background, so training can carry on.
+            Call wait_for_uploads to wait for them and raise any upload errors.
         """
-        if environment == "dev":
-            uri = self.dev_tracking_uri
-            google_project = self.dev_google_project
-            gcs_bucket = self.dev_gcs_bucket
-        else:
-            uri = self.prod_tracking_uri
-            google_project = self.prod_google_project
-            gcs_bucket = self.prod_gcs_bucket
-
-        mlflow.set_tracking_uri(uri)
-
-        mlflow.set_experiment(experiment_name)
-
-        with mlflow.start_run(run_name=run_name):
-            mlflow.set_tag("mlflow.runName", run_name)
-
-            if parameters:
-                mlflow.log_params(parameters)
-
-            if metrics:
-                mlflow.log_metrics(metrics)
-
-            if override_model_artifacts:
-                gcs_uri = mlflow.get_artifact_uri()
-
-                if not model_artifact_folder:
-                    sha = str(uuid.uuid4().hex)
-                    ## this dumps our model to a model folder
-                    model_artifact_folder = f"mlflow-models/{sha}"
-                    logger.info(
-                        f"Saving model to the following folder: {model_artifact_folder}"
-                    )
-                    eval(
-                        f"mlflow.{model_type}.save_model(model, '{model_artifact_folder}')"
-                    )
-
-                mlflow.end_run()
-
-                ## The above returns a URI like so: 'gs://bucket/mlflow/experiment_id/run_id/artifacts'
-                ## We remove the gs://bucket from it and add in /run_name/model/data to the end to ensure our folder ends up in the correct place.
-                gcs_uri = "mlflow/" + "/".join(gcs_uri.split(":/")[1:]) + "/" + run_name
-
-                logger.info(f"Overriding to the following uri: {gcs_uri}")
-
-                self.override_upload_artifacts(
-                    self.google_credentials,
-                    google_project,
-                    gcs_bucket.split("//")[1],
-                    gcs_uri,
-                    model_artifact_folder,
-                )
-
-                logger.info("Model uploaded.")
-
-            else:
-                if artifacts:
-                    mlflow.log_artifacts(artifacts)
+        return self._manager(environment).log_results(
+            experiment_name,
+            run_name,
+            model,
+            signature,
+            parameters,
+            metrics,
+            artifacts,
+            model_type,
+            override_model_artifacts,
+            model_artifact_folder,
+            background_upload,
+        )
 
-                eval(f"mlflow.{model_type}.log_model(model, '{run_name}')")
+    def wait_for_uploads(self):
+        """
+        Waits for background model uploads started by log_results, raising the first upload error.
+        """
+        self.dev_manager.wait_for_uploads()
+        self.prod_manager.wait_for_uploads()
 
     def override_upload_artifacts(
         self,
@@ -833,6 +1084,7 @@ class DualModelManager:
         bucket_name: str,
         gcs_path: str,
         local_path: str,
+        max_workers: int = 16,
     ):
         """
         Uploads a local folder to GCS.
@@ -843,26 +1095,8 @@ class DualModelManager:
             bucket_name (str): Name of the bucket your want to upload to, e.g. "uw-example-bucket"
             gcs_path (str): Name of the location in the bucket you want to save to , e.g. "model-1"
             local_path (str): Folder name to upload.
+            max_workers (int): Number of files to upload at once, at most UPLOAD_POOL_SIZE.
         """
-        client = storage.Client.from_service_account_json(
-            json_credentials_path=service_account, project=project
+        self.dev_manager.override_upload_artifacts(
+            service_account, project, bucket_name, gcs_path, local_path, max_workers
         )
-        bucket = client.bucket(bucket_name)
-
-        assert os.path.isdir(local_path)
-
-        for local_file in glob.glob(local_path + "/**"):
-            if not os.path.isfile(local_file):
-                logger.info(f"Found folder {local_file}, writing to to {gcs_path}")
-                self.override_upload_artifacts(
-                    service_account,
-                    project,
-                    bucket_name,
-                    gcs_path + "/" + os.path.basename(local_file),
-                    local_file,
-                )
-            else:
-                filename = local_file.split("/")[-1]
-                blob = bucket.blob(gcs_path + "/" + filename)
-                blob.upload_from_filename(local_file, timeout=600)
-                logger.info(f"Wrote object to {gcs_path}")
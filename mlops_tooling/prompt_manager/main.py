@@ -1,14 +1,13 @@
-import jinja2
+from mlops_tooling.templates.main import get_environment
 
 
 class PromptManager:
     def __init__(self, path: str):
         self._path = path
-        self._prompt = self._set_path()
-
-    def _set_path(self):
-        return jinja2.Environment(loader=jinja2.FileSystemLoader(self._path))
+        # Shared with the SQL connectors, so each prompt is compiled once per process
+        # and edited prompt files are still picked up
+        self._prompt = get_environment(path)
 
     def prompt(self, prompt_file: str, **kwargs) -> str:
-        prompt_output = self._prompt.get_template(prompt_file).render(kwargs)
+        prompt_output = self._prompt.get_template(prompt_file).render(**kwargs)
         return prompt_output
@@ -1,39 +1,158 @@
 import subprocess
-import re
 import argparse
-from mlops_tooling.logger import get_logger
+import functools
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from google.cloud import aiplatform
+
+from mlops_tooling.logger.main import get_logger
+from mlops_tooling.serving.main import API_RETRY
 
 logger = get_logger(__name__)
 
+BUILD_FINAL_STATUSES = {
+    "SUCCESS",
+    "FAILURE",
+    "INTERNAL_ERROR",
+    "TIMEOUT",
+    "CANCELLED",
+    "EXPIRED",
+}
+
+# Deploying can take a while as Vertex AI provisions the serving nodes
+DEPLOY_TIMEOUT = 1800
+GCLOUD_RATE_LIMIT_ERRORS = ("RESOURCE_EXHAUSTED", "Quota exceeded", "HTTPError 429")
+# Only safe to retry for commands that don't create anything, as the first attempt may have gone through
+GCLOUD_UNAVAILABLE_ERRORS = ("UNAVAILABLE", "HTTPError 503")
+
+
+@functools.lru_cache(maxsize=None)
+def _endpoint_client(region):
+    # Reused so the credentials and channel are only set up once per region
+    return aiplatform.gapic.EndpointServiceClient(
+        client_options={"api_endpoint": f"{region}-aiplatform.googleapis.com"}
+    )
+
 
 def run_subprocess(command, capture_output=False):
-    subprocess.run(command, shell=True, check=True, capture_output=capture_output)
+    return subprocess.run(command, check=True, capture_output=capture_output)
 
 
-def run_command(command, capture_output=False):
-    try:
-        run_subprocess(command, capture_output)
+def run_command(command, capture_output=False, max_retries=5, idempotent=False):
+    delay = 1.0
+    retryable_errors = GCLOUD_RATE_LIMIT_ERRORS
+    if idempotent:
+        retryable_errors += GCLOUD_UNAVAILABLE_ERRORS
+
+    for attempt in range(max_retries + 1):
+        try:
+            return run_subprocess(command, capture_output)
 
-    except Exception as e:
-        logger.error(f"Error: {e}")
+        except subprocess.CalledProcessError as e:
+            # Only captured stderr can be checked for rate limit errors
+            stderr = e.stderr.decode().strip() if e.stderr else ""
+
+            if attempt < max_retries and any(
+                error in stderr for error in retryable_errors
+            ):
+                wait = delay + random.uniform(0, delay)
+                logger.warning(
+                    f"{' '.join(command[:3])} failed with a retryable error, retrying in {wait:.1f}s"
+                )
+                time.sleep(wait)
+                delay = min(delay * 2, 30.0)
+                continue
+
+            logger.error(f"Error: {e}")
+            if stderr:
+                logger.error(stderr)
+            raise
 
 
 def set_project(project):
-    command = f"gcloud config set project {project}"
+    command = ["gcloud", "config", "set", "project", project]
 
-    run_command(command)
+    # Captured so a rate limit error can be spotted and retried
+    run_command(command, capture_output=True, idempotent=True)
 
 
 def create_artifact_repository(repository_name, region, description):
-    command = f"gcloud artifacts repositories create {repository_name} --repository-format=docker --location='{region}' --description='{description}'"
-    run_command(command)
+    command = [
+        "gcloud",
+        "artifacts",
+        "repositories",
+        "create",
+        repository_name,
+        "--repository-format=docker",
+        f"--location={region}",
+        f"--description={description}",
+    ]
+    run_command(command, capture_output=True)
+    logger.info(f"Created repository {repository_name}")
 
 
 def create_build(project, repository, region, image):
-    command = f"gcloud builds submit --region='{region}' --tag='{region}-docker.pkg.dev/{project}/{repository}/{image}'"
+    command = [
+        "gcloud",
+        "builds",
+        "submit",
+        f"--region={region}",
+        f"--tag={region}-docker.pkg.dev/{project}/{repository}/{image}",
+    ]
     run_command(command)
 
 
+def create_build_async(project, repository, region, image):
+    # Only uploads the source and queues the build, returning the build's ID
+    command = [
+        "gcloud",
+        "builds",
+        "submit",
+        "--async",
+        f"--region={region}",
+        f"--tag={region}-docker.pkg.dev/{project}/{repository}/{image}",
+        "--format=value(id)",
+    ]
+
+    build = run_command(command, capture_output=True)
+
+    return build.stdout.decode().strip()
+
+
+def wait_for_build(build_id, region, initial_interval=0.1, max_interval=5.0):
+    command = [
+        "gcloud",
+        "builds",
+        "describe",
+        build_id,
+        f"--region={region}",
+        "--format=value(status)",
+    ]
+    interval = initial_interval
+
+    # Poll with a growing interval, so short builds return quickly without
+    # hammering the API during long ones
+    while True:
+        status = (
+            run_command(command, capture_output=True, idempotent=True)
+            .stdout.decode()
+            .strip()
+        )
+
+        if status in BUILD_FINAL_STATUSES:
+            break
+
+        time.sleep(interval)
+        interval = min(max_interval, interval * 1.5)
+
+    if status != "SUCCESS":
+        raise RuntimeError(f"Build {build_id} finished with status {status}")
+
+    logger.info(f"Build {build_id} finished successfully")
+
+
 def create_model(
     project,
     repository,
@@ -44,47 +163,52 @@ def create_model(
     parent_model=False,
     env_vars=None,
 ):
-    command = f"gcloud ai models upload --container-ports=80 --container-predict-route='/predict' --container-health-route='/health' --region='{region}' --display-name='{model_name}' --container-image-uri='{region}-docker.pkg.dev/{project}/{repository}/{image}' --version-aliases=default"
-
-    if parent_model:
-        command += (
-            f" --parent-model=projects/{project}/locations/{region}/models/{model_id}"
-        )
-
-    if env_vars:
-        add_ons = ",".join(env_vars)
-        command += add_ons
+    model = aiplatform.Model.upload(
+        display_name=model_name,
+        serving_container_image_uri=f"{region}-docker.pkg.dev/{project}/{repository}/{image}",
+        serving_container_predict_route="/predict",
+        serving_container_health_route="/health",
+        serving_container_ports=[80],
+        serving_container_environment_variables=(
+            dict(env_var.split("=", 1) for env_var in env_vars) if env_vars else None
+        ),
+        parent_model=(
+            f"projects/{project}/locations/{region}/models/{model_id}"
+            if parent_model
+            else None
+        ),
+        project=project,
+        location=region,
+    )
 
-    run_command(command)
+    return model.name
 
 
 def create_model_endpoint(project, region, model_name, endpoint_id=None):
-    command = f"gcloud ai endpoints create --project={project} --region={region} --display-name={model_name}"
-
-    if endpoint_id:
-        command += f"--endpoint-id={endpoint_id}"
+    endpoint = aiplatform.Endpoint.create(
+        display_name=model_name,
+        project=project,
+        location=region,
+        endpoint_id=endpoint_id,
+    )
 
-    run_command(command)
+    return endpoint.name
 
 
 def find_model(project, region, model_name):
-    command = f"gcloud ai models list --project='{project}' --region='{region}' --filter='displayName={model_name}'"
-
-    model = run_command(command, capture_output=True)
-
-    model_id = re.search("(\d+)", model.stdout.decode("utf-8"))
+    models = API_RETRY(aiplatform.Model.list)(
+        filter=f'display_name="{model_name}"', project=project, location=region
+    )
 
-    return model_id
+    return models[0].name if models else None
 
 
 def find_endpoint(project, region, endpoint_name):
-    command = f"gcloud ai endpoints list --project='{project}' --region='{region}' --filter='displayName={endpoint_name}'"
-
-    endpoint = run_command(command, capture_output=True)
-
-    endpoint_id = re.search("(\d+)", endpoint.stdout.decode("utf-8"))
+    endpoints = API_RETRY(aiplatform.Endpoint.list)(
+        filter=f'display_name="{endpoint_name}"', project=project, location=region
+    )
 
-    return endpoint_id
+    return endpoints[0].name if endpoints else None
 
 
 def deploy_model(
@@ -93,35 +217,65 @@ def deploy_model(
     endpoint_id,
     model_id,
     model_name,
-    deployed_model_id,
-    machine_type="n1_standard-2",
+    deployed_model_id=None,
+    machine_type="n1-standard-2",
 ):
-    command = f"gcloud ai endpoints deploy-model {endpoint_id} --project='{project}' --region='{region}' --model={model_id} --traffic-split=0=100 --machine-type='{machine_type}' --display-name='{model_name}' --enable-access-logging"
+    client = _endpoint_client(region)
+
+    deployed_model = {
+        "model": f"projects/{project}/locations/{region}/models/{model_id}",
+        "display_name": model_name,
+        "enable_access_logging": True,
+        "dedicated_resources": {
+            "min_replica_count": 1,
+            "machine_spec": {
+                "machine_type": machine_type,
+            },
+        },
+    }
 
     if deployed_model_id:
-        command += f"--deployed-model-id={deployed_model_id}"
+        deployed_model["id"] = deployed_model_id
 
-    run_command(command)
+    response = client.deploy_model(
+        endpoint=client.endpoint_path(project, region, endpoint_id),
+        deployed_model=deployed_model,
+        traffic_split={"0": 100},
+    )
+
+    # Blocks on the long-running operation rather than polling the endpoint's state
+    response.result(timeout=DEPLOY_TIMEOUT)
 
 
 def undeploy_model(project, region, endpoint_id, model_id):
-    command = f"gcloud ai endpoints undeploy-model {endpoint_id} --project='{project}' --region='{region}' --deployed-model-id='{model_id}'"
+    endpoint = aiplatform.Endpoint(endpoint_id, project=project, location=region)
 
-    run_command(command)
+    # model_id can be either the deployed model's ID or the ID of the model it serves
+    for deployed_model in endpoint.list_models():
+        if model_id in (deployed_model.id, deployed_model.model.rpartition("/")[2]):
+            endpoint.undeploy(deployed_model.id)
 
 
 def delete_endpoint(project, region, endpoint_id):
-    command = f"gcloud ai endpoints delete {endpoint_id} --project='{project}' --region='{region}'"
-
-    run_command(command)
+    aiplatform.Endpoint(endpoint_id, project=project, location=region).delete()
 
 
 def check_repository(repository_name, region):
-    command = f"gcloud artifacts repositories describe {repository_name} --location='{region}'"
+    command = [
+        "gcloud",
+        "artifacts",
+        "repositories",
+        "describe",
+        repository_name,
+        f"--location={region}",
+    ]
 
-    repository = run_command(command, capture_output=True)
+    # A missing repository is expected here, so this doesn't go through run_command
+    try:
+        return run_subprocess(command, capture_output=True)
 
-    return repository
+    except subprocess.CalledProcessError:
+        return None
 
 
 def deploy(
@@ -133,41 +287,62 @@ def deploy(
     model_env_vars=None,
     repository_name=None,
     repository_description=None,
-    machine_type="n1_standard-2",
+    machine_type="n1-standard-2",
 ):
-    # Start by defining the Google project
-    set_project(project)
+    # The SDK calls pass the project explicitly, so the lookups can run while gcloud
+    # is being set up. The build only needs the repository, so it runs while any
+    # existing deployment is torn down and the new endpoint is created
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        # Check if we have any existing models and endpoints using the names specified
+        deployed_model = executor.submit(find_model, project, region, model_name)
+        deployed_endpoint = executor.submit(find_endpoint, project, region, model_name)
+
+        # Start by defining the Google project
+        set_project(project)
+
+        # Next we check if we need to create a repository
+        if repository_name:
+            repository = check_repository(repository_name, region)
+
+            # If we have a repository matching the name, we skip creation
+            # Otherwise we create a new repository
+            if not repository:
+                create_artifact_repository(
+                    repository_name, region, repository_description or repository_name
+                )
+            else:
+                logger.info("Repository already exists, skipping creation")
+
+        # Then we build our docker image
+        build = executor.submit(
+            create_build_async, project, repository_name, region, model_name
+        )
 
-    # Next we check if we need to create a repository
-    if repository_name:
-        repository_description = check_repository(repository_name, region)
+        deployed_model_id = deployed_model.result()
+        deployed_endpoint_id = deployed_endpoint.result() if deployed_model_id else None
+        endpoint_exists = False
 
-        # If we have a repository matching the name, we skip creation
-        # Otherwise we create a new repository
-        if not repository_description:
-            create_artifact_repository(repository_name, region, repository_name)
-        else:
-            logger.info("Repository already exists, skipping creation")
+        # If we have any existing models and endpoints, we delete them
+        if deployed_endpoint_id:
+            undeploy_model(project, region, deployed_endpoint_id, deployed_model_id)
 
-    # Check if we have any existing models and endpoints using the names specified
-    deployed_model_id = find_model(project, region, model_name)
+            endpoint_exists = deployed_endpoint_id == endpoint_id
 
-    # If we have any existing models and endpoints, we delete them
-    if deployed_model_id:
-        deployed_endpoint_id = find_endpoint(project, region, model_name)
-        undeploy_model(project, region, deployed_endpoint_id, deployed_model_id)
+            if not endpoint_exists:
+                delete_endpoint(project, region, deployed_endpoint_id)
 
-        endpoint_exists = deployed_endpoint_id != endpoint_id
+        if not endpoint_exists:
+            # Create an endpoint for the model, it doesn't need the model itself
+            endpoint_id = create_model_endpoint(
+                project, region, model_name, endpoint_id
+            )
 
-        if deployed_endpoint_id != endpoint_id:
-            delete_endpoint(project, region, deployed_endpoint_id)
-
-    # THen we build our docker image
-    create_build(project, repository_name, region, model_name)
+        wait_for_build(build.result(), region)
 
     has_parent_model = deployed_model_id == model_id if model_id else False
 
-    create_model(
+    # Uploading returns the model's ID, so there is no need to look it up afterwards
+    model_id = create_model(
         project,
         repository_name,
         region,
@@ -178,19 +353,10 @@ def deploy(
         model_env_vars,
     )
 
-    if not model_id:
-        # Find the model's ID
-        model_id = find_model(project, region, model_name)
-
-    if not endpoint_exists:
-        # Create an endpoint for the model
-        create_model_endpoint(project, region, model_name)
-
-        # Find the endpoint ID
-        endpoint_id = find_endpoint(project, region, model_name)
-
     # And deploy the model to the endpoint.
-    deploy_model(project, region, model_name, endpoint_id, model_id, machine_type)
+    deploy_model(
+        project, region, endpoint_id, model_id, model_name, machine_type=machine_type
+    )
 
     logger.info("Model deployed successfully")
 
@@ -222,7 +388,7 @@ def parse_arguments():
     )
     parser.add_argument(
         "--machine-type",
-        default="n1_standard-2",
+        default="n1-standard-2",
         required=False,
         help="Machine type for deployment",
     )
@@ -1,8 +1,37 @@
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from google.api_core import exceptions, retry
 from google.cloud import aiplatform
 from mlops_tooling.logger.main import get_logger
 
 logger = get_logger(__name__)
 
+# Rate limited or briefly unavailable Vertex AI requests are retried with jittered exponential backoff
+API_RETRY = retry.Retry(
+    predicate=retry.if_exception_type(
+        exceptions.ResourceExhausted,
+        exceptions.ServiceUnavailable,
+    ),
+    initial=1.0,
+    maximum=30.0,
+    multiplier=2.0,
+    timeout=300.0,
+)
+# A create can still succeed behind a 503, so creates are only retried when rate limited
+CREATE_RETRY = API_RETRY.with_predicate(
+    retry.if_exception_type(exceptions.ResourceExhausted)
+)
+
+
+@functools.lru_cache(maxsize=8)
+def _get_job_client(api_endpoint: str) -> aiplatform.gapic.JobServiceClient:
+    # The AI Platform services require regional API endpoints.
+    client_options = {"api_endpoint": api_endpoint}
+
+    return aiplatform.gapic.JobServiceClient(client_options=client_options)
+
+
 ## NOTE: This area contains two nearly identical functions.
 ## Both functions will end up with the same results, however the means by which they achieve their goals are different.
 ## The first of the two functions, create_batch_run, starts a batch job in the middle of the script, waits for the job to finish, then continues.
@@ -24,6 +53,8 @@ def create_batch_run(
     batch_size: int = 64,
     location: str = "europe-west2",
     api_endpoint: str = "europe-west2-aiplatform.googleapis.com",
+    starting_replica_count: int = 1,
+    max_replica_count: int = 10,
 ):
     # NB: This function runs as a normal function would.
     # It will run until the job has completed, and then you can continue with your workflow.
@@ -44,6 +75,8 @@ def create_batch_run(
             accelerator_type=accelerator_type,
             accelerator_count=accelerator_count,
             batch_size=batch_size,
+            starting_replica_count=starting_replica_count,
+            max_replica_count=max_replica_count,
         )
 
     else:
@@ -55,6 +88,8 @@ def create_batch_run(
             predictions_format=predictions_format,
             machine_type=machine_type,
             batch_size=batch_size,
+            starting_replica_count=starting_replica_count,
+            max_replica_count=max_replica_count,
         )
 
     return batch_prediction_job
@@ -73,16 +108,14 @@ def create_batch_job(
     accelerator_count: int = 0,
     location: str = "europe-west2",
     api_endpoint: str = "europe-west2-aiplatform.googleapis.com",
+    starting_replica_count: int = 1,
+    max_replica_count: int = 10,
 ):
     # NB: This function works as an async function
     # We call it and it runs in the background, allowing us to continue working.
 
-    # The AI Platform services require regional API endpoints.
-    client_options = {"api_endpoint": api_endpoint}
-
-    # Initialize client that will be used to create and send requests.
-    # This client only needs to be created once, and can be reused for multiple requests.
-    client = aiplatform.gapic.JobServiceClient(client_options=client_options)
+    # This client only needs to be created once, and is reused for every request to the same endpoint.
+    client = _get_job_client(api_endpoint)
 
     batch_prediction_job = {
         "display_name": display_name,
@@ -101,14 +134,37 @@ def create_batch_job(
                 "accelerator_type": accelerator_type,
                 "accelerator_count": accelerator_count,
             },
-            "starting_replica_count": 1,
-            "max_replica_count": 1,
+            "starting_replica_count": starting_replica_count,
+            "max_replica_count": max_replica_count,
         },
     }
 
     parent = f"projects/{project}/locations/{location}"
 
     response = client.create_batch_prediction_job(
-        parent=parent, batch_prediction_job=batch_prediction_job
+        parent=parent, batch_prediction_job=batch_prediction_job, retry=CREATE_RETRY
     )
     logger.info(response)
+
+    return response
+
+
+def create_batch_jobs(jobs: list, max_workers: int = 8):
+    # NB: Schedules several batch jobs at once, each item holds the keyword arguments for create_batch_job.
+    # The requests are sent concurrently over the shared client, rather than one after another.
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(create_batch_job, **job) for job in jobs]
+
+    failed = [future for future in futures if future.exception()]
+    if failed:
+        # Jobs that were created are still running, so name them to avoid scheduling them twice
+        for job, future in zip(jobs, futures):
+            if future.exception():
+                logger.error(
+                    f"Failed to create {job['display_name']}: {future.exception()}"
+                )
+            else:
+                logger.info(f"Created {job['display_name']} as {future.result().name}")
+        raise failed[0].exception()
+
+    return [future.result() for future in futures]
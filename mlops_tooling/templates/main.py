@@ -0,0 +1,17 @@
+import functools
+import jinja2
+
+
+@functools.lru_cache(maxsize=None)
+def get_environment(path: str) -> jinja2.Environment:
+    """
+    Returns a Jinja2 environment for a template folder, shared between the SQL connectors and prompt managers.
+
+    Compiled templates are cached on the environment, so reusing it across
+    instances means each template is only compiled once per process. The
+    bytecode cache also persists compiled templates between processes.
+    """
+    return jinja2.Environment(
+        loader=jinja2.FileSystemLoader(path),
+        bytecode_cache=jinja2.FileSystemBytecodeCache(),
+    )